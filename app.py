@@ -1,26 +1,92 @@
 import os
-import json
+import sys
+import signal
+import asyncio
+import anyio
+import orjson
+import functools
+import hashlib
+import string
+import tempfile
+import unicodedata
 import logging
-from datetime import datetime
-from fastapi import FastAPI, HTTPException, BackgroundTasks, File, UploadFile, Form
+import multiprocessing
+import threading
+import time
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Dict, Any
+from fastapi.openapi.docs import get_redoc_html, get_swagger_ui_html
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response
+from fastapi.utils import is_body_allowed_for_status_code
+from slowapi import Limiter, _rate_limit_exceeded_handler
+from slowapi.errors import RateLimitExceeded
+from slowapi.util import get_remote_address
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from typing import List, Dict, Any, BinaryIO, NamedTuple, Optional, Set, Tuple
 import google.generativeai as genai
+from google.generativeai import caching
+import google.auth
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import storage
-import PyPDF2
-from io import BytesIO
-import traceback
+from requests.adapters import HTTPAdapter
+import redis.asyncio as aioredis
+from cachetools import LRUCache, TTLCache
+import diskcache
+import zstandard
+from google.api_core.exceptions import Conflict, NotFound, PreconditionFailed
+import pypdfium2 as pdfium
+from rank_bm25 import BM25Okapi
 import uuid
-from werkzeug.utils import secure_filename
 import re
 
 # Import Pydantic models
-from models import AnalysisRequest, PipelineRequest, AnalysisResult
+from models import AnalysisRequest, PipelineRequest, QueuedJob, AnalysisResult, Step1Response, Step1BatchResponse, Step2Response, Step3Response
+from pdf_extract import PDFIUM_LOCK, extract_page_range, read_pages
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Threads for blocking GCS and PDF work (asyncio.to_thread). The loop's default
+# executor is capped at min(32, cpu_count + 4), which concurrent uploads and
+# regulation downloads exhaust on small Cloud Run instances.
+IO_POOL_SIZE = int(os.getenv('IO_POOL_SIZE', 64))
+
+# Environment variables that must be set (and non-empty) for the app to start
+REQUIRED_ENV_VARS = ('GEMINI_API_KEY',)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Size the thread pools and start background job tasks for the lifetime of the app."""
+    # Checked at worker startup so gunicorn stops instead of serving without Gemini
+    missing_vars = [var for var in REQUIRED_ENV_VARS if not os.environ.get(var)]
+    if missing_vars:
+        logger.error("Missing required environment variables: %s", missing_vars)
+        raise RuntimeError(f"Missing required environment variables: {missing_vars}")
+    
+    io_pool = ThreadPoolExecutor(max_workers=IO_POOL_SIZE, thread_name_prefix="io")
+    asyncio.get_running_loop().set_default_executor(io_pool)
+    # Starlette runs UploadFile I/O and any sync callables through AnyIO's own
+    # thread limiter (40 by default); give it the same headroom
+    anyio.to_thread.current_default_thread_limiter().total_tokens = IO_POOL_SIZE
+    tasks = [asyncio.create_task(job_worker()) for _ in range(JOB_WORKERS)]
+    if redis_client is None:
+        tasks.append(asyncio.create_task(expire_jobs_loop()))
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for job_id, req in interrupted_jobs:
+        await release_interrupted_job(job_id, req)
+    interrupted_jobs.clear()
+    io_pool.shutdown(wait=False)
+    if get_pdf_process_pool.cache_info().currsize:
+        get_pdf_process_pool().shutdown(wait=False, cancel_futures=True)
+
 app = FastAPI(
     title="ATOMS Requirements Analysis API",
     description="""
@@ -53,12 +119,91 @@ Built with FastAPI and deployed on Google Cloud Run.
         "name": "Proprietary",
         "url": "https://atoms.tech/license",
     },
-    docs_url="/docs",
-    redoc_url="/redoc",
-    openapi_url="/openapi.json"
+    # Served from cached bytes by the routes under "API Documentation"
+    docs_url=None,
+    redoc_url=None,
+    openapi_url=None,
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
+
+# Rate limiting for the Gemini-backed endpoints, per organization when the
+# client sends X-Org-Id and per client address otherwise. Counters live in
+# Redis when it is configured so the limit holds across workers.
+#
+# slowapi only drives limits' synchronous strategies, so each check is a
+# blocking Redis round trip on the event loop (limits' async+redis:// storage
+# needs the limits.aio strategies, which slowapi cannot call). A check costs
+# one INCR on a nearby Redis; the short timeouts cap the stall when Redis is
+# slow, and the in-memory fallback keeps requests flowing while it is down.
+ANALYSIS_RATE_LIMIT = os.getenv('ANALYSIS_RATE_LIMIT', '10/minute')
+
+def rate_limit_key(request: Request) -> str:
+    """Get the rate limiting key for a request."""
+    return request.headers.get("X-Org-Id") or get_remote_address(request)
+
+RATE_LIMIT_REDIS_TIMEOUT = 0.25
+
+limiter = Limiter(
+    key_func=rate_limit_key,
+    storage_uri=os.getenv('REDIS_URL', 'memory://'),
+    storage_options={
+        'socket_timeout': RATE_LIMIT_REDIS_TIMEOUT,
+        'socket_connect_timeout': RATE_LIMIT_REDIS_TIMEOUT
+    },
+    in_memory_fallback_enabled=True
 )
+app.state.limiter = limiter
+app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+# Error bodies are formatted from this template, so a burst of failures (a
+# Gemini outage, say) only serializes each detail value
+ERROR_TEMPLATE = b'{"detail":%b}'
+
+@app.exception_handler(StarletteHTTPException)
+async def http_exception_handler(request: Request, exc: StarletteHTTPException):
+    """Render HTTP errors from ERROR_TEMPLATE."""
+    headers = getattr(exc, "headers", None)
+    if not is_body_allowed_for_status_code(exc.status_code):
+        return Response(status_code=exc.status_code, headers=headers)
+    return Response(
+        content=ERROR_TEMPLATE % orjson.dumps(exc.detail),
+        status_code=exc.status_code,
+        headers=headers,
+        media_type="application/json"
+    )
+
+# Request bodies above this size are rejected before they are read. The check
+# relies on Content-Length, so bodies sent without one (chunked) are refused
+MAX_UPLOAD_MB = int(os.getenv('MAX_UPLOAD_MB', 50))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+REQUEST_TOO_LARGE_BODY = ERROR_TEMPLATE % orjson.dumps(f"Request body exceeds the {MAX_UPLOAD_MB} MB limit")
+LENGTH_REQUIRED_BODY = ERROR_TEMPLATE % orjson.dumps("Request bodies must declare a Content-Length")
+
+# Every PDF starts with this signature; checked before accepting an upload
+PDF_MAGIC = b"%PDF-"
 
-# Enable CORS
+# Only the first MAX_PDF_PAGES pages of a regulation are parsed
+MAX_PDF_PAGES = 1000
+
+# Regulations with at least PDF_PARALLEL_MIN_PAGES pages are split into page
+# ranges extracted by a process pool (PDFium cannot be used from threads)
+PDF_PARALLEL_MIN_PAGES = 64
+# Counted from the CPUs this process may run on, which unlike os.cpu_count()
+# follows the container's CPU limit rather than the host's
+PDF_PROCESSES = int(os.getenv('PDF_PROCESSES', min(4, len(os.sched_getaffinity(0)))))
+
+@app.middleware("http")
+async def limit_request_size(request: Request, call_next):
+    """Reject requests whose body exceeds MAX_UPLOAD_BYTES or has no declared length."""
+    content_length = request.headers.get("content-length")
+    if content_length is None and "transfer-encoding" in request.headers:
+        return Response(content=LENGTH_REQUIRED_BODY, status_code=411, media_type="application/json")
+    if content_length is not None and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES:
+        return Response(content=REQUEST_TOO_LARGE_BODY, status_code=413, media_type="application/json")
+    return await call_next(request)
+
+# Enable CORS (added last so it also wraps the responses above)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -71,14 +216,263 @@ app.add_middleware(
 if os.getenv('GEMINI_API_KEY'):
     genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
 
-# Initialize Google Cloud Storage client
-storage_client = storage.Client()
+# Shared across all analysis steps; the constructor makes no network calls,
+# so this is safe to build even when the API key is not set yet.
+GEMINI_MODEL_NAME = 'gemini-1.5-flash'
+GEMINI_MODEL = genai.GenerativeModel(GEMINI_MODEL_NAME)
+
+# Regulations of at least GEMINI_CACHE_MIN_TOKENS (Gemini's context cache
+# minimum) are uploaded once as cached content, so Step 2 sees the whole
+# document and repeat analyses pay for it at the cached rate. Smaller ones
+# are sent inline as BM25-selected pages. Caching needs a pinned version.
+GEMINI_CACHE_MODEL_NAME = 'models/gemini-1.5-flash-002'
+GEMINI_CACHE_MIN_TOKENS = 32_768
+GEMINI_CACHE_MAX_TOKENS = 900_000
+GEMINI_CACHE_TTL = timedelta(hours=1)
+# Models bound to cached content, dropped five minutes before it expires on the
+# server; None marks a regulation whose upload failed
+gemini_cache_tasks: TTLCache = TTLCache(maxsize=128, ttl=GEMINI_CACHE_TTL.total_seconds() - 300)
+
+# Initialize Google Cloud Storage client on a pooled session. GCS calls run in
+# the I/O thread pool, and requests' default pool of 10 would drop and
+# re-handshake connections once more threads than that talk to GCS at once.
+GCS_HTTP_POOL_SIZE = IO_POOL_SIZE
+gcs_credentials, gcs_project = google.auth.default(scopes=storage.Client.SCOPE)
+gcs_session = AuthorizedSession(gcs_credentials)
+gcs_session.mount("https://", HTTPAdapter(pool_connections=GCS_HTTP_POOL_SIZE, pool_maxsize=GCS_HTTP_POOL_SIZE))
+storage_client = storage.Client(project=gcs_project, credentials=gcs_credentials, _http=gcs_session)
 
-# In-memory job storage (in production, use Redis or database)
-job_storage: Dict[str, Dict[str, Any]] = {}
+# Approximate token budget for regulation text in the Step 2 prompt.
+# Gemini averages about 4 characters per token on English prose.
+MAX_REGULATION_TOKENS = 6000
+CHARS_PER_TOKEN = 4
+
+# Buckets confirmed to exist, keyed by organization ID, so document endpoints
+# skip the existence probe on every request
+BUCKET_CACHE_TTL_SECONDS = 300
+bucket_cache: TTLCache = TTLCache(maxsize=1024, ttl=BUCKET_CACHE_TTL_SECONDS)
+
+# Step 2 reads the RELEVANT_PAGES_TOP_K regulation pages most relevant to the
+# requirement, packed into up to STEP2_MAX_CHUNKS prompts of MAX_REGULATION_TOKENS
+# that are analyzed in parallel; the merged result keeps the best passages
+RELEVANT_PAGES_TOP_K = 15
+STEP2_MAX_CHUNKS = 4
+STEP2_MAX_PASSAGES = 10
+
+# Parsed regulations, keyed by the MD5 of the PDF that Cloud Storage keeps in
+# the blob metadata, so identical copies (versioned re-uploads, the same
+# standard in several organizations) are parsed once and a changed file is
+# always re-parsed. Blobs without an MD5 (composite objects) fall back to
+# their generation. The in-process tier holds the BM25 index and is filled from worker
+# threads; the disk tier keeps extracted pages across processes and restarts.
+REGULATION_CACHE_TTL_SECONDS = 3600
+REGULATION_CACHE_DIR = os.getenv('REGULATION_CACHE_DIR', '/tmp/regulation-cache')
+# The default directory is in memory on Cloud Run, so keep the disk tier well
+# below instance memory; diskcache evicts the oldest entries beyond this
+REGULATION_CACHE_MAX_MB = int(os.getenv('REGULATION_CACHE_MAX_MB', 256))
+regulation_cache: TTLCache = TTLCache(maxsize=128, ttl=REGULATION_CACHE_TTL_SECONDS)
+regulation_cache_lock = threading.Lock()
+regulation_disk_cache = diskcache.Cache(REGULATION_CACHE_DIR, size_limit=REGULATION_CACHE_MAX_MB * 1024 * 1024)
+
+# Uploads are sent as resumable uploads in chunks of this size (must be a
+# multiple of 256 KB); the storage client buffers one chunk at a time
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_TIMEOUT_SECONDS = 300
+
+# Attempts at claiming a versioned filename before an upload gives up
+MAX_UPLOAD_NAME_ATTEMPTS = 5
+
+# Files from one upload request sent to Cloud Storage at the same time
+MAX_CONCURRENT_UPLOADS = 8
+
+# Job storage: Redis when REDIS_URL is set, so every worker and instance sees
+# the same jobs; otherwise a bounded in-memory cache for single-process
+# deployments. Both keep a job for JOB_TTL_SECONDS after its last update.
+JOB_TTL_SECONDS = 24 * 3600
+MAX_STORED_JOBS = 10_000
+JOB_EXPIRE_INTERVAL_SECONDS = 60
+redis_client = aioredis.Redis.from_url(os.environ['REDIS_URL']) if os.getenv('REDIS_URL') else None
+
+# Gunicorn (and uvicorn when run directly) reads WEB_CONCURRENCY as its
+# worker process count
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+if WEB_CONCURRENCY > 1 and redis_client is None:
+    logger.warning(
+        "WEB_CONCURRENCY=%s without REDIS_URL: each worker keeps its own jobs, "
+        "so GET /api/ai may not find jobs submitted to another worker",
+        WEB_CONCURRENCY
+    )
+
+class JobCache(TTLCache):
+    """TTLCache that remembers the ids of the jobs it has dropped."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.evicted: LRUCache = LRUCache(maxsize=maxsize * 10)
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for job_id, _ in expired:
+            self.evicted[job_id] = True
+        return expired
+
+    def popitem(self):
+        job_id, job = super().popitem()
+        self.evicted[job_id] = True
+        return job_id, job
+
+# Only touched from the event loop, and never across an await, so it needs
+# no lock and gains nothing from sharding. Processes never share it: with
+# more than one worker, jobs live in Redis instead.
+job_storage: JobCache = JobCache(maxsize=MAX_STORED_JOBS, ttl=JOB_TTL_SECONDS)
+
+# Long-polling status requests wait on a per-job event (in memory) or on a
+# Redis pub/sub channel, which the job runner signals on DONE/FAILED.
+TERMINAL_JOB_STATES = ('DONE', 'FAILED')
+MAX_STATUS_WAIT_SECONDS = 60
+job_events: Dict[str, asyncio.Event] = {}
+
+# Submissions are queued and drained by JOB_WORKERS consumer tasks, which
+# caps how many analyses run at once. With Redis the queue is shared, so
+# queued jobs survive restarts and any instance can pick them up; otherwise
+# it is a local asyncio queue.
+JOB_QUEUE_KEY = "jobs:queue"
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 16))
+# Submissions are refused with 503 once this many jobs are waiting
+MAX_QUEUED_JOBS = int(os.getenv('MAX_QUEUED_JOBS', 1000))
+local_job_queue: "asyncio.Queue[Tuple[str, AnalysisRequest]]" = asyncio.Queue()
+# Jobs whose worker was cancelled mid-run, released by the lifespan at shutdown
+interrupted_jobs: List[Tuple[str, AnalysisRequest]] = []
+
+# Job fields that already hold zstd-compressed JSON. They are stored and
+# returned as-is, so a finished result is serialized once, not on every
+# status poll, and takes a fraction of the memory in Redis or job_storage.
+RAW_JOB_FIELDS = ('result',)
+
+# zstd level for job results and cached regulation pages; level 3 compresses
+# English text about 4x at several hundred MB/s
+ZSTD_LEVEL = 3
+
+# Finished analyses, keyed by a hash of the request and the regulation's
+# content, so a repeated submission (UI retries, CI checks) skips Gemini.
+# In Redis when REDIS_URL is set, otherwise per process.
+ANALYSIS_CACHE_TTL_SECONDS = 7 * 24 * 3600
+analysis_cache: TTLCache = TTLCache(maxsize=1024, ttl=ANALYSIS_CACHE_TTL_SECONDS)
 
 # --- Helper Functions ---
 
+def format_utc(moment: datetime) -> str:
+    """Format an aware datetime as ISO 8601 in UTC with a Z suffix."""
+    return moment.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+
+def utc_timestamp() -> str:
+    """Get the current time as an ISO 8601 UTC timestamp."""
+    return format_utc(datetime.now(timezone.utc))
+
+# Analysis results keep timestamps as aware datetimes and let orjson write
+# them in C; OPT_UTC_Z gives the same Z-suffixed form as format_utc
+ANALYSIS_JSON_OPTIONS = orjson.OPT_UTC_Z
+
+def job_key(job_id: str) -> str:
+    """Get Redis key for a job record."""
+    return f"job:{job_id}"
+
+async def set_job(job_id: str, fields: Dict[str, Any]) -> None:
+    """Create a job record or update some of its fields."""
+    if redis_client is None:
+        # Reassign so the TTL restarts on every update, as EXPIRE does in Redis
+        job = job_storage.get(job_id, {})
+        job.update(fields)
+        job_storage[job_id] = job
+        return
+    key = job_key(job_id)
+    # One round trip, and the record never exists without its expiry
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.hset(key, mapping={
+            field: value if field in RAW_JOB_FIELDS else orjson.dumps(value)
+            for field, value in fields.items()
+        })
+        pipe.expire(key, JOB_TTL_SECONDS)
+        await pipe.execute()
+
+async def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Get a job record, or None if it does not exist (or has expired)."""
+    if redis_client is None:
+        return job_storage.get(job_id)
+    data = await redis_client.hgetall(job_key(job_id))
+    job = {}
+    for field, value in data.items():
+        field = field.decode()
+        job[field] = value if field in RAW_JOB_FIELDS else orjson.loads(value)
+    return job or None
+
+def format_job_time(job: Dict[str, Any], field: str) -> Optional[str]:
+    """Format a job's {field}_ns epoch timestamp as UTC ISO 8601, if it is set."""
+    timestamp_ns = job.get(f"{field}_ns")
+    if timestamp_ns is None:
+        return None
+    return format_utc(datetime.fromtimestamp(timestamp_ns / 1e9, tz=timezone.utc))
+
+def job_expired(job_id: str) -> bool:
+    """Check whether an in-memory job existed but has since been dropped."""
+    if redis_client is not None:
+        return False
+    job_storage.expire()
+    return job_id in job_storage.evicted
+
+async def expire_jobs_loop():
+    """Drop expired in-memory jobs periodically, even when nothing is read."""
+    while True:
+        await asyncio.sleep(JOB_EXPIRE_INTERVAL_SECONDS)
+        job_storage.expire()
+
+def job_done_channel(job_id: str) -> str:
+    """Get Redis pub/sub channel announcing a job's completion."""
+    return f"job-done:{job_id}"
+
+async def notify_job_done(job_id: str) -> None:
+    """Wake any status requests waiting for this job to finish."""
+    if redis_client is None:
+        event = job_events.pop(job_id, None)
+        if event is not None:
+            event.set()
+        return
+    await redis_client.publish(job_done_channel(job_id), "1")
+
+async def wait_for_job(job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+    """Get a job record, waiting up to timeout seconds for it to finish."""
+    if redis_client is None:
+        job = job_storage.get(job_id)
+        if job is None or job['state'] in TERMINAL_JOB_STATES:
+            return job
+        event = job_events.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return job_storage.get(job_id)
+
+    async with redis_client.pubsub() as pubsub:
+        await pubsub.subscribe(job_done_channel(job_id))
+        # Read after subscribing so a completion in between is not missed
+        job = await get_job(job_id)
+        if job is None or job['state'] in TERMINAL_JOB_STATES:
+            return job
+        deadline = asyncio.get_running_loop().time() + timeout
+        while (remaining := deadline - asyncio.get_running_loop().time()) > 0:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+            if message is not None:
+                break
+    return await get_job(job_id)
+
+UNSAFE_FILENAME_CHARS = re.compile(r"[^A-Za-z0-9._-]+")
+
+def sanitize_filename(filename: str) -> str:
+    """Reduce an uploaded filename to a safe ASCII object name."""
+    basename = os.path.basename(filename.replace("\\", "/"))
+    basename = unicodedata.normalize("NFKD", basename).encode("ascii", "ignore").decode("ascii")
+    return UNSAFE_FILENAME_CHARS.sub("_", basename)[:255].strip("._") or "file.pdf"
+
 def get_organization_bucket_name(organization_id: str) -> str:
     """Get bucket name for organization."""
     return f"{organization_id}-requirements"
@@ -86,139 +480,321 @@ def get_organization_bucket_name(organization_id: str) -> str:
 def create_bucket_if_not_exists(bucket_name: str) -> storage.Bucket:
     """Create bucket if it doesn't exist."""
     try:
-        bucket = storage_client.bucket(bucket_name)
-        if not bucket.exists():
-            bucket = storage_client.create_bucket(bucket_name, location="US")
-            logger.info(f"Created bucket: {bucket_name}")
+        # Only called after a lookup missed, so try the create straight away
+        bucket = storage_client.create_bucket(bucket_name, location="US")
+        logger.info("Created bucket: %s", bucket_name)
         return bucket
+    except Conflict:
+        return storage_client.bucket(bucket_name)
     except Exception as e:
-        logger.error(f"Error creating bucket {bucket_name}: {str(e)}")
+        logger.error("Error creating bucket %s: %s", bucket_name, e)
         raise
 
+async def get_organization_bucket(organization_id: str) -> storage.Bucket:
+    """Get organization's bucket, raising FileNotFoundError if it doesn't exist."""
+    bucket = bucket_cache.get(organization_id)
+    if bucket is not None:
+        return bucket
+    
+    bucket_name = get_organization_bucket_name(organization_id)
+    bucket = storage_client.bucket(bucket_name)
+    if not await asyncio.to_thread(bucket.exists):
+        raise FileNotFoundError(f"Organization bucket not found: {bucket_name}")
+    bucket_cache[organization_id] = bucket
+    return bucket
+
 def get_versioned_filename(bucket: storage.Bucket, base_filename: str) -> str:
     """Get a versioned filename if the base filename already exists."""
     name, ext = os.path.splitext(base_filename)
-    blob = bucket.blob(base_filename)
-    if not blob.exists():
+    # Names are sanitized to [A-Za-z0-9._-], so they contain no glob syntax
+    existing = {blob.name for blob in bucket.list_blobs(prefix=name, match_glob=f"{name}*{ext}")}
+    if base_filename not in existing:
         return base_filename
     
-    counter = 1
-    while True:
-        versioned_name = f"{name}({counter}){ext}"
-        blob = bucket.blob(versioned_name)
-        if not blob.exists():
-            return versioned_name
-        counter += 1
+    version_pattern = re.compile(rf"{re.escape(name)}\((\d+)\){re.escape(ext)}")
+    versions = (version_pattern.fullmatch(existing_name) for existing_name in existing)
+    counter = max((int(match.group(1)) for match in versions if match), default=0) + 1
+    return f"{name}({counter}){ext}"
 
 async def list_organization_documents(organization_id: str) -> List[Dict[str, Any]]:
     """List all documents in an organization's bucket."""
     try:
-        bucket_name = get_organization_bucket_name(organization_id)
-        bucket = storage_client.bucket(bucket_name)
-        
-        if not bucket.exists():
+        try:
+            bucket = await get_organization_bucket(organization_id)
+        except FileNotFoundError:
             return []
         
+        blobs = await asyncio.to_thread(lambda: list(bucket.list_blobs()))
         documents = []
-        for blob in bucket.list_blobs():
+        for blob in blobs:
             documents.append({
                 "name": blob.name,
                 "size": blob.size,
-                "created": blob.time_created.isoformat() if blob.time_created else None,
-                "updated": blob.updated.isoformat() if blob.updated else None
+                "created": format_utc(blob.time_created) if blob.time_created else None,
+                "updated": format_utc(blob.updated) if blob.updated else None
             })
         return documents
     except Exception as e:
-        logger.error(f"Error listing documents for organization {organization_id}: {str(e)}")
+        logger.error("Error listing documents for organization %s: %s", organization_id, e)
         raise HTTPException(status_code=500, detail=f"Failed to list documents: {str(e)}")
 
 async def delete_organization_document(organization_id: str, document_name: str) -> bool:
     """Delete a document from an organization's bucket."""
     try:
-        bucket_name = get_organization_bucket_name(organization_id)
-        bucket = storage_client.bucket(bucket_name)
+        bucket = await get_organization_bucket(organization_id)
         
-        if not bucket.exists():
-            raise FileNotFoundError(f"Organization bucket not found: {bucket_name}")
-        
-        blob = bucket.blob(document_name)
-        if not blob.exists():
+        try:
+            await asyncio.to_thread(bucket.delete_blob, document_name)
+        except NotFound:
             raise FileNotFoundError(f"Document not found: {document_name}")
-        
-        blob.delete()
-        logger.info(f"Deleted document {document_name} from organization {organization_id}")
+        logger.info("Deleted document %s from organization %s", document_name, organization_id)
         return True
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
-        logger.error(f"Error deleting document {document_name} for organization {organization_id}: {str(e)}")
+        logger.error("Error deleting document %s for organization %s: %s", document_name, organization_id, e)
         raise HTTPException(status_code=500, detail=f"Failed to delete document: {str(e)}")
 
-def extract_text_from_pdf(pdf_content: bytes) -> str:
-    """Extract text from PDF bytes."""
+class RegulationIndex(NamedTuple):
+    """Extracted regulation pages plus a BM25 index over them (None when there is no text)."""
+    key: str
+    pages: List[str]
+    bm25: Optional[BM25Okapi]
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens for BM25."""
+    return WORD_PATTERN.findall(text.lower())
+
+@functools.lru_cache(maxsize=None)
+def get_pdf_process_pool() -> ProcessPoolExecutor:
+    """Get the process pool for extracting large PDFs, started on first use."""
+    # spawn, not fork: the parent has running threads and open connections
+    return ProcessPoolExecutor(max_workers=PDF_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+
+pdf_process_pool_lock = threading.Lock()
+
+def replace_pdf_process_pool(broken_pool: ProcessPoolExecutor) -> None:
+    """Drop a broken process pool so the next get_pdf_process_pool() starts a new one."""
+    # Several extractions may hit the same broken pool; only the first replaces it
+    with pdf_process_pool_lock:
+        if get_pdf_process_pool.cache_info().currsize and get_pdf_process_pool() is broken_pool:
+            get_pdf_process_pool.cache_clear()
+    broken_pool.shutdown(wait=False, cancel_futures=True)
+
+def extract_in_processes(pool: ProcessPoolExecutor, pdf_path: str, page_count: int) -> List[str]:
+    """Extract the first page_count pages of a PDF file in the process pool."""
+    # One contiguous page range per process, joined back in page order
+    range_size = -(-page_count // PDF_PROCESSES)
+    futures = [
+        pool.submit(extract_page_range, pdf_path, start, min(start + range_size, page_count))
+        for start in range(0, page_count, range_size)
+    ]
+    return [page for future in futures for page in future.result()]
+
+def extract_text_from_pdf(pdf_path: str) -> List[str]:
+    """Extract text from a PDF file, one string per page.
+    
+    An unreadable PDF yields no pages; other failures are raised so that
+    callers do not mistake them for an empty document.
+    """
     try:
-        pdf_reader = PyPDF2.PdfReader(BytesIO(pdf_content))
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text
+        with PDFIUM_LOCK:
+            # Opened from the path, PDFium reads pages on demand instead of holding the whole file
+            pdf = pdfium.PdfDocument(pdf_path)
+            total_pages = len(pdf)
+        try:
+            if total_pages > MAX_PDF_PAGES:
+                logger.warning("PDF has %s pages, extracting the first %s", total_pages, MAX_PDF_PAGES)
+            page_count = min(total_pages, MAX_PDF_PAGES)
+            if page_count < PDF_PARALLEL_MIN_PAGES or PDF_PROCESSES < 2:
+                return read_pages(pdf, 0, page_count)
+        finally:
+            with PDFIUM_LOCK:
+                pdf.close()
+        
+        pool = get_pdf_process_pool()
+        try:
+            return extract_in_processes(pool, pdf_path, page_count)
+        except BrokenProcessPool:
+            # A child died (a PDFium crash or an OOM kill), which leaves the
+            # pool unusable; start a new one and try once more
+            logger.warning("PDF process pool broke, restarting it", exc_info=True)
+            replace_pdf_process_pool(pool)
+            return extract_in_processes(get_pdf_process_pool(), pdf_path, page_count)
+    except pdfium.PdfiumError as e:
+        logger.error("Error extracting PDF text: %s", e)
+        return []
+
+def build_regulation_index(key: str, pages: List[str]) -> RegulationIndex:
+    """Build a BM25 index over regulation pages."""
+    tokenized_pages = [tokenize(page) for page in pages]
+    if not any(tokenized_pages):
+        return RegulationIndex(key, pages, None)
+    return RegulationIndex(key, pages, BM25Okapi(tokenized_pages))
+
+def rank_pages(regulation: RegulationIndex, query: str, top_k: int = RELEVANT_PAGES_TOP_K) -> List[int]:
+    """Get the indices of the top_k pages most relevant to query, most relevant first."""
+    query_tokens = tokenize(query)
+    if regulation.bm25 is None or not query_tokens:
+        return list(range(min(top_k, len(regulation.pages))))
+    scores = regulation.bm25.get_scores(query_tokens)
+    return sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:top_k]
+
+def chunk_relevant_pages(regulation: RegulationIndex, query: str) -> List[str]:
+    """Pack the pages most relevant to query into prompt-sized chunks, each in document order."""
+    max_chars = MAX_REGULATION_TOKENS * CHARS_PER_TOKEN
+    chunks: List[List[int]] = []
+    chunk_chars = 0
+    for i in rank_pages(regulation, query):
+        if not chunks or chunk_chars + len(regulation.pages[i]) > max_chars:
+            if len(chunks) == STEP2_MAX_CHUNKS:
+                break
+            chunks.append([])
+            chunk_chars = 0
+        chunks[-1].append(i)
+        chunk_chars += len(regulation.pages[i])
+    return [
+        truncate_to_token_budget(format_pages(regulation, sorted(chunk)), MAX_REGULATION_TOKENS)
+        for chunk in chunks
+    ] or [""]
+
+def format_pages(regulation: RegulationIndex, selected) -> str:
+    """Join the selected pages, labelled with page numbers."""
+    return "\n".join(f"[Page {i + 1}]\n{regulation.pages[i]}" for i in selected)
+
+def load_regulation_index(bucket_name: str, blob_name: str, generation: int, md5_hash: Optional[str] = None) -> RegulationIndex:
+    """Get the index of one blob generation, downloading and extracting it on a cache miss."""
+    key = f"md5:{md5_hash}" if md5_hash else f"{bucket_name}/{blob_name}@{generation}"
+    with regulation_cache_lock:
+        regulation = regulation_cache.get(key)
+    if regulation is not None:
+        return regulation
+    
+    # Pages are kept on disk as zstd-compressed JSON
+    disk_key = f"{key}.json.zst"
+    cached_pages = regulation_disk_cache.get(disk_key)
+    if cached_pages is not None:
+        pages = orjson.loads(zstandard.decompress(cached_pages))
+    else:
+        blob = storage_client.bucket(bucket_name).blob(blob_name, generation=generation)
+        # Streamed to disk rather than held in memory as one bytes object
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf_file:
+            blob.download_to_file(pdf_file)
+            pdf_file.flush()
+            pages = extract_text_from_pdf(pdf_file.name)
+        # The disk tier never expires and is shared by every copy of the file,
+        # so a document that yielded no text is kept only in memory
+        if pages:
+            regulation_disk_cache.set(disk_key, zstandard.compress(orjson.dumps(pages), ZSTD_LEVEL))
+    
+    regulation = build_regulation_index(key, pages)
+    with regulation_cache_lock:
+        regulation_cache[key] = regulation
+    return regulation
+
+def warm_regulation_cache(bucket_name: str, blob_name: str, generation: int, md5_hash: Optional[str]) -> None:
+    """Parse a freshly uploaded regulation so the first analysis finds it cached."""
+    try:
+        load_regulation_index(bucket_name, blob_name, generation, md5_hash)
     except Exception as e:
-        logger.error(f"Error extracting PDF text: {str(e)}")
-        return ""
+        logger.warning("Failed to pre-parse %s: %s", blob_name, e)
 
-async def get_regulation_document(document_name: str, organization_id: str) -> str:
-    """Download and extract text from regulation document in organization's bucket."""
+async def find_regulation_blob(document_name: str, organization_id: str) -> storage.Blob:
+    """Look up a regulation document's blob, with its metadata, in organization's bucket."""
     try:
-        bucket_name = get_organization_bucket_name(organization_id)
-        bucket = storage_client.bucket(bucket_name)
-        
-        if not bucket.exists():
-            raise FileNotFoundError(f"Organization bucket not found: {bucket_name}")
+        bucket = await get_organization_bucket(organization_id)
         
         possible_extensions = ['.pdf', '.PDF']
         for ext in possible_extensions:
             try:
                 blob_name = f"{document_name}{ext}" if not document_name.endswith(ext) else document_name
-                blob = bucket.blob(blob_name)
-                if blob.exists():
-                    pdf_content = blob.download_as_bytes()
-                    return extract_text_from_pdf(pdf_content)
+                blob = await asyncio.to_thread(bucket.get_blob, blob_name)
+                if blob is not None:
+                    return blob
             except Exception as e:
-                logger.warning(f"Failed to download {blob_name}: {str(e)}")
+                logger.warning("Failed to look up %s: %s", blob_name, e)
                 continue
         
-        raise FileNotFoundError(f"Document {document_name} not found in bucket {bucket_name}")
+        raise FileNotFoundError(f"Document {document_name} not found in bucket {bucket.name}")
     except Exception as e:
-        logger.error(f"Error getting regulation document: {str(e)}")
+        logger.error("Error getting regulation document: %s", e)
         raise
 
-async def upload_file_to_organization_bucket(file_content: bytes, filename: str, organization_id: str) -> str:
-    """Upload file to organization's Cloud Storage bucket."""
+async def get_regulation_document(blob: storage.Blob) -> RegulationIndex:
+    """Download, extract and index a regulation document."""
     try:
-        bucket_name = get_organization_bucket_name(organization_id)
-        bucket = create_bucket_if_not_exists(bucket_name)
-        
-        secure_name = secure_filename(filename)
-        final_filename = get_versioned_filename(bucket, secure_name)
+        return await asyncio.to_thread(
+            load_regulation_index, blob.bucket.name, blob.name, blob.generation, blob.md5_hash
+        )
+    except Exception as e:
+        logger.warning("Failed to download %s: %s", blob.name, e)
+        raise FileNotFoundError(f"Document {blob.name} could not be read") from e
+
+async def upload_file_to_organization_bucket(file_obj: BinaryIO, filename: str, organization_id: str, size: Optional[int] = None) -> str:
+    """Stream a file-like object into organization's Cloud Storage bucket.
+    
+    With a known size, files up to 8 MB go up in a single multipart request
+    instead of opening a resumable upload session first.
+    """
+    try:
+        try:
+            bucket = await get_organization_bucket(organization_id)
+        except FileNotFoundError:
+            bucket_name = get_organization_bucket_name(organization_id)
+            bucket = await asyncio.to_thread(create_bucket_if_not_exists, bucket_name)
+            bucket_cache[organization_id] = bucket
         
-        blob = bucket.blob(final_filename)
-        blob.upload_from_string(file_content, content_type='application/pdf')
+        secure_name = sanitize_filename(filename)
+        # Uploads run concurrently, so two files may resolve to the same versioned
+        # name; if_generation_match=0 makes the loser retry with the next free name.
+        for _ in range(MAX_UPLOAD_NAME_ATTEMPTS):
+            final_filename = await asyncio.to_thread(get_versioned_filename, bucket, secure_name)
+            blob = bucket.blob(final_filename, chunk_size=UPLOAD_CHUNK_SIZE)
+            try:
+                await asyncio.to_thread(
+                    blob.upload_from_file, file_obj,
+                    size=size, rewind=True, content_type='application/pdf', if_generation_match=0, timeout=UPLOAD_TIMEOUT_SECONDS
+                )
+                break
+            except PreconditionFailed:
+                logger.info("%s was taken by a concurrent upload, retrying", final_filename)
+        else:
+            raise RuntimeError(f"Could not find a free filename for {secure_name}")
         
-        logger.info(f"File {final_filename} uploaded to organization {organization_id} bucket")
+        logger.info("File %s uploaded to organization %s bucket", final_filename, organization_id)
+        # Parsed in the background; the upload response does not wait for it
+        asyncio.get_running_loop().run_in_executor(
+            None, warm_regulation_cache, bucket.name, blob.name, blob.generation, blob.md5_hash
+        )
         return final_filename
     except Exception as e:
-        logger.error(f"Error uploading file: {str(e)}")
+        logger.error("Error uploading file: %s", e)
         raise
 
-async def analyze_requirement_step1(original_requirement: str, system_name: str = "", objective: str = "", req_id: str = "", temperature: float = 0.1) -> Dict:
-    """Step 1: Initial Requirements Analysis using INCOSE and EARS standards."""
-    prompt = f"""
+def truncate_to_token_budget(text: str, max_tokens: int) -> str:
+    """Trim text to roughly max_tokens, ending on a sentence or line boundary when possible."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    truncated = text[:max_chars]
+    boundary = max(truncated.rfind(". "), truncated.rfind("\n"))
+    if boundary > max_chars // 2:
+        return truncated[:boundary + 1]
+    return truncated
+
+# --- Prompt Templates ---
+# Built once at import; analysis timestamps are stamped server-side after each
+# response instead of being echoed back by the model.
+
+STEP1_PROMPT = string.Template("""
     As a requirements engineering expert, analyze the following requirement against INCOSE and EARS (Easy Approach to Requirements Syntax) standards.
 
-    System Name: {system_name}
-    Objective: {objective}
-    Original Requirement: {original_requirement}
-    REQ-ID: {req_id}
+    System Name: $system_name
+    Objective: $objective
+    Original Requirement: $original_requirement
+    REQ-ID: $req_id
 
     Please provide a comprehensive analysis that includes:
 
@@ -239,7 +815,7 @@ async def analyze_requirement_step1(original_requirement: str, system_name: str
        - Rate the requirement quality (1-10 scale)
 
     Return your response as a valid JSON object with the following structure:
-    {{
+    {
         "req_id": "extracted or provided REQ_ID",
         "original_requirement": "the original requirement text",
         "incose_format": "requirement rewritten in INCOSE format",
@@ -248,32 +824,58 @@ async def analyze_requirement_step1(original_requirement: str, system_name: str
         "ears_violations": ["list of EARS violations found"],
         "requirement_pattern": "functional/performance/interface/etc",
         "quality_rating": "1-10 rating",
-        "feedback": "detailed feedback and recommendations",
-        "analysis_timestamp": "{datetime.now().isoformat()}"
-    }}
-    """
-    try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = await model.generate_content_async(
-            prompt,
-            generation_config=genai.types.GenerationConfig(temperature=temperature)
-        )
-        response_text = response.text.strip().replace("```json", "").replace("```", "")
-        return json.loads(response_text)
-    except Exception as e:
-        logger.error(f"Error in Step 1 analysis: {str(e)}")
-        raise
+        "feedback": "detailed feedback and recommendations"
+    }
+    """)
 
-async def analyze_regulation_step2(requirement_analysis: Dict, regulation_text: str, regulation_doc_name: str, temperature: float = 0.1) -> Dict:
-    """Step 2: Regulatory Research and Compliance Analysis."""
-    prompt = f"""
+# Step 1 prompt for several requirements answered in one call
+STEP1_BATCH_PROMPT = string.Template("""
+    As a requirements engineering expert, analyze each of the following requirements independently against INCOSE and EARS (Easy Approach to Requirements Syntax) standards.
+
+    Requirements (JSON array; each has index, system_name, objective, original_requirement and req_id):
+    $requirements
+
+    For each requirement, provide a comprehensive analysis that includes:
+
+    1. INCOSE Format Analysis:
+       - Rewrite the requirement following INCOSE best practices
+       - Identify any INCOSE rule violations
+       - Provide feedback on clarity, completeness, and correctness
+
+    2. EARS Format Analysis:
+       - Rewrite the requirement in EARS format (When <trigger>, the <system> shall <response>)
+       - Identify the trigger, system, and response components
+       - Provide feedback on EARS compliance
+
+    3. Structured Analysis:
+       - Extract/assign REQ_ID if not provided
+       - Identify requirement patterns (functional, performance, interface, etc.)
+       - List specific violations and recommendations
+       - Rate the requirement quality (1-10 scale)
+
+    Return your response as a valid JSON array with exactly one object per requirement, each with the following structure:
+    {
+        "index": "the requirement's index, copied unchanged",
+        "req_id": "extracted or provided REQ_ID",
+        "original_requirement": "the original requirement text",
+        "incose_format": "requirement rewritten in INCOSE format",
+        "ears_format": "requirement rewritten in EARS format",
+        "incose_violations": ["list of INCOSE violations found"],
+        "ears_violations": ["list of EARS violations found"],
+        "requirement_pattern": "functional/performance/interface/etc",
+        "quality_rating": "1-10 rating",
+        "feedback": "detailed feedback and recommendations"
+    }
+    """)
+
+STEP2_PROMPT = string.Template("""
     As a regulatory compliance expert, analyze the following requirement against the provided regulation document.
 
     Requirement Analysis from Step 1:
-    {json.dumps(requirement_analysis, indent=2)}
+    $requirement_analysis
 
-    Regulation Document: {regulation_doc_name}
-    Regulation Text: {regulation_text[:10000]}...  # Truncate for context limit
+    Regulation Document: $regulation_doc_name
+    Regulation Text: $regulation_text
 
     Tasks:
     1. Search through the regulation text for passages relevant to this requirement
@@ -282,43 +884,60 @@ async def analyze_regulation_step2(requirement_analysis: Dict, regulation_text:
     4. Assess potential compliance issues or conflicts
 
     Return your response as a valid JSON object with the following structure:
-    {{
-        "regulation_document": "{regulation_doc_name}",
+    {
+        "regulation_document": "$regulation_doc_name",
         "relevant_passages": [
-            {{
+            {
                 "section": "section/clause identifier",
                 "text": "relevant regulatory text",
                 "relevance_score": "1-10 how relevant this passage is",
                 "impact": "description of how this impacts the requirement"
-            }}
+            }
         ],
         "compliance_concerns": ["list of potential compliance issues"],
-        "regulatory_keywords": ["key terms found in regulation relevant to requirement"],
-        "analysis_timestamp": "{datetime.now().isoformat()}"
-    }}
-    """
-    try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = await model.generate_content_async(
-            prompt,
-            generation_config=genai.types.GenerationConfig(temperature=temperature)
-        )
-        response_text = response.text.strip().replace("```json", "").replace("```", "")
-        return json.loads(response_text)
-    except Exception as e:
-        logger.error(f"Error in Step 2 analysis: {str(e)}")
-        raise
+        "regulatory_keywords": ["key terms found in regulation relevant to requirement"]
+    }
+    """)
 
-async def analyze_compliance_step3(requirement_analysis: Dict, regulation_analysis: Dict, temperature: float = 0.1) -> Dict:
-    """Step 3: Compliance Integration and Enhanced Requirements."""
-    prompt = f"""
+# Step 2 prompt when the regulation is already in the model's cached context
+STEP2_CACHED_PROMPT = string.Template("""
+    As a regulatory compliance expert, analyze the following requirement against the regulation document provided in context.
+
+    Requirement Analysis from Step 1:
+    $requirement_analysis
+
+    Regulation Document: $regulation_doc_name
+
+    Tasks:
+    1. Search through the regulation text for passages relevant to this requirement
+    2. Identify specific regulatory clauses, sections, or standards that apply
+    3. Extract relevant regulatory text that could impact the requirement
+    4. Assess potential compliance issues or conflicts
+
+    Return your response as a valid JSON object with the following structure:
+    {
+        "regulation_document": "$regulation_doc_name",
+        "relevant_passages": [
+            {
+                "section": "section/clause identifier",
+                "text": "relevant regulatory text",
+                "relevance_score": "1-10 how relevant this passage is",
+                "impact": "description of how this impacts the requirement"
+            }
+        ],
+        "compliance_concerns": ["list of potential compliance issues"],
+        "regulatory_keywords": ["key terms found in regulation relevant to requirement"]
+    }
+    """)
+
+STEP3_PROMPT = string.Template("""
     As a systems engineering expert, integrate the requirement analysis with regulatory findings to produce enhanced, compliant requirements.
 
     Requirement Analysis (Step 1):
-    {json.dumps(requirement_analysis, indent=2)}
+    $requirement_analysis
 
     Regulatory Analysis (Step 2): 
-    {json.dumps(regulation_analysis, indent=2)}
+    $regulation_analysis
 
     Tasks:
     1. Combine requirement analysis with regulatory findings
@@ -328,7 +947,7 @@ async def analyze_compliance_step3(requirement_analysis: Dict, regulation_analys
     5. Create a final requirement that satisfies all standards
 
     Return your response as a valid JSON object with the following structure:
-    {{
+    {
         "final_requirement_ears": "final requirement in EARS format with regulatory compliance",
         "final_requirement_incose": "final requirement in INCOSE format with regulatory compliance", 
         "compliance_status": "COMPLIANT/NON_COMPLIANT/PARTIAL",
@@ -337,73 +956,492 @@ async def analyze_compliance_step3(requirement_analysis: Dict, regulation_analys
         "compliance_recommendations": ["specific recommendations for full compliance"],
         "regulatory_traceability": ["list of regulatory sections this requirement traces to"],
         "final_quality_rating": "1-10 rating for the enhanced requirement",
-        "enhancement_summary": "summary of improvements made to achieve compliance",
-        "analysis_timestamp": "{datetime.now().isoformat()}"
-    }}
-    """
+        "enhancement_summary": "summary of improvements made to achieve compliance"
+    }
+    """)
+
+async def analyze_requirement_step1(original_requirement: str, system_name: str = "", objective: str = "", req_id: str = "", temperature: float = 0.1) -> Dict:
+    """Step 1: Initial Requirements Analysis using INCOSE and EARS standards."""
+    prompt = STEP1_PROMPT.substitute(
+        system_name=system_name,
+        objective=objective,
+        original_requirement=original_requirement,
+        req_id=req_id
+    )
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = await model.generate_content_async(
+        response = await GEMINI_MODEL.generate_content_async(
             prompt,
-            generation_config=genai.types.GenerationConfig(temperature=temperature)
+            generation_config=genai.types.GenerationConfig(
+                temperature=temperature,
+                response_mime_type="application/json",
+                response_schema=Step1Response
+            )
         )
-        response_text = response.text.strip().replace("```json", "").replace("```", "")
-        return json.loads(response_text)
+        result = orjson.loads(response.text)
+        result["analysis_timestamp"] = datetime.now(timezone.utc)
+        return result
     except Exception as e:
-        logger.error(f"Error in Step 3 analysis: {str(e)}")
+        logger.error("Error in Step 1 analysis: %s", e)
         raise
 
-async def run_analysis_job(job_id: str, analysis_params: Dict):
-    """Run the analysis job in background."""
+async def analyze_requirements_step1_batch(requests: List[AnalysisRequest], temperature: float = 0.1) -> List[Dict]:
+    """Step 1 for several requirements in a single Gemini call, results in request order."""
+    requirements = [
+        {
+            "index": index,
+            "system_name": req.system_name,
+            "objective": req.objective,
+            "original_requirement": req.original_requirement,
+            "req_id": req.req_id
+        }
+        for index, req in enumerate(requests)
+    ]
+    prompt = STEP1_BATCH_PROMPT.substitute(requirements=orjson.dumps(requirements).decode())
+    response = await GEMINI_MODEL.generate_content_async(
+        prompt,
+        generation_config=genai.types.GenerationConfig(
+            temperature=temperature,
+            response_mime_type="application/json",
+            response_schema=list[Step1BatchResponse]
+        )
+    )
+    # Results are matched to requests by the index echoed back, not by their
+    # position or text, which the model may reorder or reword
+    results = orjson.loads(response.text)
+    results_by_index = {result.pop("index", None): result for result in results}
+    if len(results) != len(requests) or set(results_by_index) != set(range(len(requests))):
+        raise ValueError(f"Expected Step 1 results for indices 0 to {len(requests) - 1}, got {sorted(results_by_index, key=str)}")
+    results = [results_by_index[index] for index in range(len(requests))]
+    timestamp = datetime.now(timezone.utc)
+    for result in results:
+        result["analysis_timestamp"] = timestamp
+    return results
+
+class Step1Batcher:
+    """Groups Step 1 requests from concurrent jobs into batched Gemini calls."""
+
+    def __init__(self, max_size: int, max_wait: float):
+        self.max_size = max_size
+        self.max_wait = max_wait
+        # Requests waiting to be sent and their flush timers, per organization
+        # and temperature; requirements of different organizations never
+        # share a prompt
+        self.pending: Dict[Tuple[str, float], List[Tuple[AnalysisRequest, asyncio.Future]]] = {}
+        self.timers: Dict[Tuple[str, float], asyncio.TimerHandle] = {}
+        self.tasks: Set[asyncio.Task] = set()
+
+    async def analyze(self, req: AnalysisRequest) -> Dict:
+        """Run Step 1 for one request as part of the next batch."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (req.organizationId, req.temperature)
+        batch = self.pending.setdefault(key, [])
+        batch.append((req, future))
+        if len(batch) >= self.max_size:
+            self.flush(key)
+        elif len(batch) == 1:
+            self.timers[key] = loop.call_later(self.max_wait, self.flush, key)
+        return await future
+
+    def flush(self, key: Tuple[str, float]) -> None:
+        """Send the requests pending for an organization and temperature."""
+        timer = self.timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        task = asyncio.create_task(self.run(self.pending.pop(key), key[1]))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def run(self, batch: List[Tuple[AnalysisRequest, asyncio.Future]], temperature: float) -> None:
+        """Analyze a batch and hand each result to its waiting request."""
+        requests = [req for req, _ in batch]
+        results: List[Any] = []
+        if len(requests) > 1:
+            try:
+                results = await analyze_requirements_step1_batch(requests, temperature)
+            except Exception as e:
+                logger.warning("Batched Step 1 failed, analyzing %s requirements individually: %s", len(requests), e)
+        if not results:
+            results = await asyncio.gather(
+                *(
+                    analyze_requirement_step1(
+                        req.original_requirement, req.system_name, req.objective, req.req_id, req.temperature
+                    )
+                    for req in requests
+                ),
+                return_exceptions=True
+            )
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+# Step 1 calls from concurrent jobs are sent together, up to STEP1_BATCH_SIZE
+# requirements per Gemini request, after waiting at most STEP1_BATCH_WAIT_SECONDS
+STEP1_BATCH_SIZE = 8
+STEP1_BATCH_WAIT_SECONDS = 0.05
+step1_batcher = Step1Batcher(max_size=STEP1_BATCH_SIZE, max_wait=STEP1_BATCH_WAIT_SECONDS)
+
+def create_regulation_cache(regulation: RegulationIndex) -> genai.GenerativeModel:
+    """Upload a whole regulation as Gemini cached content and get a model bound to it."""
+    cached_content = caching.CachedContent.create(
+        model=GEMINI_CACHE_MODEL_NAME,
+        display_name=regulation.key[:128],
+        contents=[format_pages(regulation, range(len(regulation.pages)))],
+        ttl=GEMINI_CACHE_TTL
+    )
+    # Built once per cache entry and shared, like GEMINI_MODEL
+    return genai.GenerativeModel.from_cached_content(cached_content)
+
+async def get_regulation_cache(regulation: RegulationIndex) -> Optional[genai.GenerativeModel]:
+    """Get a model whose context holds the whole regulation, or None if it is not cacheable."""
+    estimated_tokens = sum(len(page) for page in regulation.pages) // CHARS_PER_TOKEN
+    if not GEMINI_CACHE_MIN_TOKENS <= estimated_tokens <= GEMINI_CACHE_MAX_TOKENS:
+        return None
+    
+    # Concurrent analyses of the same regulation share one upload
     try:
-        logger.info(f"Starting analysis job {job_id}")
-        job_storage[job_id]['state'] = 'RUNNING'
-        
-        req = AnalysisRequest(**analysis_params)
+        task = gemini_cache_tasks[regulation.key]
+    except KeyError:
+        task = asyncio.create_task(asyncio.to_thread(create_regulation_cache, regulation))
+        gemini_cache_tasks[regulation.key] = task
+    # A failed upload is remembered as None until it expires, so later analyses
+    # of the regulation send selected pages without retrying it first
+    if task is None:
+        return None
+    try:
+        return await asyncio.shield(task)
+    except Exception as e:
+        if gemini_cache_tasks.get(regulation.key) is task:
+            gemini_cache_tasks[regulation.key] = None
+            logger.warning("Failed to cache regulation %s, sending selected pages instead: %s", regulation.key, e)
+        return None
+
+RELEVANCE_SCORE_PATTERN = re.compile(r"\d+")
+
+def relevance_score(passage: Dict) -> int:
+    """Get the leading integer of a passage's relevance_score, or 0 if it has none."""
+    match = RELEVANCE_SCORE_PATTERN.search(str(passage.get("relevance_score", "")))
+    return int(match.group()) if match else 0
+
+def merge_step2_results(results: List[Dict]) -> Dict:
+    """Merge Step 2 results from several regulation chunks, keeping the most relevant passages."""
+    # sorted() is stable, so equally relevant passages keep chunk order
+    passages = sorted(
+        (passage for result in results for passage in result.get("relevant_passages", [])),
+        key=relevance_score,
+        reverse=True
+    )
+    return {
+        "regulation_document": results[0].get("regulation_document"),
+        "relevant_passages": passages[:STEP2_MAX_PASSAGES],
+        "compliance_concerns": list(dict.fromkeys(
+            concern for result in results for concern in result.get("compliance_concerns", [])
+        )),
+        "regulatory_keywords": list(dict.fromkeys(
+            keyword for result in results for keyword in result.get("regulatory_keywords", [])
+        ))
+    }
+
+async def generate_step2(model: genai.GenerativeModel, prompt: str, temperature: float) -> Dict:
+    """Run one Step 2 prompt and parse its structured response."""
+    response = await model.generate_content_async(
+        prompt,
+        generation_config=genai.types.GenerationConfig(
+            temperature=temperature,
+            response_mime_type="application/json",
+            response_schema=Step2Response
+        )
+    )
+    return orjson.loads(response.text)
+
+async def analyze_regulation_step2(requirement_analysis: Dict, regulation: RegulationIndex, regulation_doc_name: str, temperature: float = 0.1) -> Dict:
+    """Step 2: Regulatory Research and Compliance Analysis."""
+    requirement_json = orjson.dumps(requirement_analysis, option=ANALYSIS_JSON_OPTIONS).decode()
+    try:
+        cached_model = await get_regulation_cache(regulation)
+        if cached_model is not None:
+            result = await generate_step2(
+                cached_model,
+                STEP2_CACHED_PROMPT.substitute(
+                    requirement_analysis=requirement_json,
+                    regulation_doc_name=regulation_doc_name
+                ),
+                temperature
+            )
+        else:
+            query = " ".join(
+                requirement_analysis.get(field) or "" for field in ("original_requirement", "incose_format", "ears_format")
+            )
+            results = await asyncio.gather(*(
+                generate_step2(
+                    GEMINI_MODEL,
+                    STEP2_PROMPT.substitute(
+                        requirement_analysis=requirement_json,
+                        regulation_doc_name=regulation_doc_name,
+                        regulation_text=chunk
+                    ),
+                    temperature
+                )
+                for chunk in chunk_relevant_pages(regulation, query)
+            ))
+            result = results[0] if len(results) == 1 else merge_step2_results(results)
+        result["analysis_timestamp"] = datetime.now(timezone.utc)
+        return result
+    except Exception as e:
+        logger.error("Error in Step 2 analysis: %s", e)
+        raise
 
-        # Step 1
-        analysis_json = await analyze_requirement_step1(
+async def analyze_compliance_step3(requirement_analysis: Dict, regulation_analysis: Dict, temperature: float = 0.1) -> Dict:
+    """Step 3: Compliance Integration and Enhanced Requirements."""
+    prompt = STEP3_PROMPT.substitute(
+        requirement_analysis=orjson.dumps(requirement_analysis, option=ANALYSIS_JSON_OPTIONS).decode(),
+        regulation_analysis=orjson.dumps(regulation_analysis, option=ANALYSIS_JSON_OPTIONS).decode()
+    )
+    try:
+        response = await GEMINI_MODEL.generate_content_async(
+            prompt,
+            generation_config=genai.types.GenerationConfig(
+                temperature=temperature,
+                response_mime_type="application/json",
+                response_schema=Step3Response
+            )
+        )
+        result = orjson.loads(response.text)
+        result["analysis_timestamp"] = datetime.now(timezone.utc)
+        return result
+    except Exception as e:
+        logger.error("Error in Step 3 analysis: %s", e)
+        raise
+
+def analysis_cache_key(req: AnalysisRequest, regulation_blob: Optional[storage.Blob]) -> str:
+    """Hash everything an analysis result depends on, including the regulation's content."""
+    regulation = None
+    if regulation_blob is not None:
+        regulation = regulation_blob.md5_hash or f"{regulation_blob.bucket.name}/{regulation_blob.name}@{regulation_blob.generation}"
+    parts = [
+        req.original_requirement, req.system_name, req.objective, req.req_id,
+        req.regulation_document_name, regulation, req.temperature, GEMINI_MODEL_NAME
+    ]
+    return hashlib.blake2b(orjson.dumps(parts), digest_size=16).hexdigest()
+
+ANALYSIS_CACHE_FIELDS = ("analysisJson", "analysisJson2", "analysisJson3")
+
+async def get_cached_analysis(cache_key: str) -> Optional[Tuple[bytes, bytes, bytes]]:
+    """Get the serialized results of an identical earlier analysis, if still cached."""
+    if redis_client is None:
+        return analysis_cache.get(cache_key)
+    data = await redis_client.hmget(f"analysis:{cache_key}", ANALYSIS_CACHE_FIELDS)
+    if None in data:
+        return None
+    return tuple(zstandard.decompress(value) for value in data)
+
+async def set_cached_analysis(cache_key: str, results: Tuple[bytes, bytes, bytes]) -> None:
+    """Cache the serialized results of an analysis for ANALYSIS_CACHE_TTL_SECONDS."""
+    if redis_client is None:
+        analysis_cache[cache_key] = results
+        return
+    key = f"analysis:{cache_key}"
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.hset(key, mapping={
+            field: zstandard.compress(value, ZSTD_LEVEL)
+            for field, value in zip(ANALYSIS_CACHE_FIELDS, results)
+        })
+        pipe.expire(key, ANALYSIS_CACHE_TTL_SECONDS)
+        await pipe.execute()
+
+# Analysis response body. The step results are already serialized, so they
+# are spliced in as bytes instead of being walked again as one big dict.
+ANALYSIS_RESULT_TEMPLATE = (
+    b'{"status":"success",%b"analysisJson":%b,"analysisJson2":%b,"analysisJson3":%b,"processed_timestamp":%b}'
+)
+
+def render_analysis_result(results: Tuple[bytes, bytes, bytes], organization_id: Optional[str] = None) -> bytes:
+    """Assemble the JSON analysis result from serialized step results."""
+    organization = b'"organizationId":%b,' % orjson.dumps(organization_id) if organization_id is not None else b""
+    return ANALYSIS_RESULT_TEMPLATE % (organization, *results, orjson.dumps(datetime.now(timezone.utc), option=ANALYSIS_JSON_OPTIONS))
+
+# Job status body, ending with the job's result or error when it has one
+JOB_STATUS_TEMPLATE = b'{"runId":%b,"organizationId":%b,"state":%b,"started_at":%b,"completed_at":%b%b}'
+
+async def run_analysis_pipeline(req: AnalysisRequest, batch_step1: bool = False) -> Tuple[bytes, bytes, bytes]:
+    """Run the three analysis steps, fetching the regulation concurrently with Step 1.
+    
+    Each step's result is returned serialized to JSON.
+    """
+    try:
+        regulation_blob = await find_regulation_blob(req.regulation_document_name, req.organizationId)
+    except FileNotFoundError:
+        regulation_blob = None
+    
+    cache_key = analysis_cache_key(req, regulation_blob)
+    cached = await get_cached_analysis(cache_key)
+    if cached is not None:
+        logger.info("Reusing cached analysis %s", cache_key)
+        return cached
+    
+    if batch_step1:
+        step1 = step1_batcher.analyze(req)
+    else:
+        step1 = analyze_requirement_step1(
             req.original_requirement, req.system_name, req.objective, req.req_id, req.temperature
         )
-        
-        # Step 2
+    step1_task = asyncio.create_task(step1)
+    regulation_task = None
+    if regulation_blob is not None:
+        regulation_task = asyncio.create_task(get_regulation_document(regulation_blob))
+    
+    # Step 1
+    try:
+        analysis_json = await step1_task
+    except BaseException:
+        # Nothing will use the regulation now; stop it rather than leave it orphaned
+        if regulation_task is not None:
+            regulation_task.cancel()
+        raise
+    
+    # Step 2
+    regulation = None
+    if regulation_task is not None:
         try:
-            regulation_text = await get_regulation_document(req.regulation_document_name, req.organizationId)
-            analysis_json2 = await analyze_regulation_step2(
-                analysis_json, regulation_text, req.regulation_document_name, req.temperature
-            )
+            regulation = await regulation_task
         except FileNotFoundError:
-            analysis_json2 = {
-                "regulation_document": req.regulation_document_name,
-                "relevant_passages": [],
-                "compliance_concerns": ["No regulation document found for analysis"],
-                "regulatory_keywords": [],
-                "analysis_timestamp": datetime.now().isoformat()
-            }
-        
-        # Step 3
-        analysis_json3 = await analyze_compliance_step3(
-            analysis_json, analysis_json2, req.temperature
+            pass
+    
+    if regulation is not None:
+        analysis_json2 = await analyze_regulation_step2(
+            analysis_json, regulation, req.regulation_document_name, req.temperature
         )
-        
-        response_data = {
-            "status": "success",
-            "analysisJson": analysis_json,
-            "analysisJson2": analysis_json2, 
-            "analysisJson3": analysis_json3,
-            "processed_timestamp": datetime.now().isoformat()
+    else:
+        analysis_json2 = {
+            "regulation_document": req.regulation_document_name,
+            "relevant_passages": [],
+            "compliance_concerns": ["No regulation document found for analysis"],
+            "regulatory_keywords": [],
+            "analysis_timestamp": datetime.now(timezone.utc)
         }
+    
+    # Step 3
+    analysis_json3 = await analyze_compliance_step3(
+        analysis_json, analysis_json2, req.temperature
+    )
+    results = tuple(
+        orjson.dumps(analysis, option=ANALYSIS_JSON_OPTIONS) for analysis in (analysis_json, analysis_json2, analysis_json3)
+    )
+    # A regulation that exists but could not be read is likely a transient
+    # failure; its fallback Step 2 result must not outlive it under the real key
+    if regulation_blob is None or regulation is not None:
+        await set_cached_analysis(cache_key, results)
+    return results
+
+async def run_analysis_job(job_id: str, req: AnalysisRequest):
+    """Run the analysis job in background."""
+    try:
+        logger.info("Starting analysis job %s", job_id)
+        await set_job(job_id, {'state': 'RUNNING'})
+        
+        # Background jobs can afford the short wait to share a Step 1 call
+        results = await run_analysis_pipeline(req, batch_step1=True)
         
-        job_storage[job_id]['state'] = 'DONE'
-        job_storage[job_id]['result'] = response_data
-        job_storage[job_id]['completed_at'] = datetime.now().isoformat()
-        logger.info(f"Analysis job {job_id} completed successfully")
+        await set_job(job_id, {
+            'state': 'DONE',
+            'result': zstandard.compress(render_analysis_result(results), ZSTD_LEVEL),
+            'completed_at_ns': time.time_ns()
+        })
+        logger.info("Analysis job %s completed successfully", job_id)
         
+    except asyncio.CancelledError:
+        # Shutdown cancels running workers; the lifespan releases the job
+        # once no worker is left blocked in BRPOP to swallow it
+        interrupted_jobs.append((job_id, req))
+        raise
     except Exception as e:
-        logger.error(f"Job {job_id} failed: {str(e)}")
-        job_storage[job_id]['state'] = 'FAILED'
-        job_storage[job_id]['error'] = str(e)
-        job_storage[job_id]['completed_at'] = datetime.now().isoformat()
+        logger.error("Job %s failed: %s", job_id, e)
+        await set_job(job_id, {
+            'state': 'FAILED',
+            'error': str(e),
+            'completed_at_ns': time.time_ns()
+        })
+    
+    await notify_job_done(job_id)
+
+async def enqueue_job(job_id: str, req: AnalysisRequest) -> None:
+    """Queue an analysis job for the job workers."""
+    if redis_client is None:
+        # Same process, so the validated model is handed over as-is
+        local_job_queue.put_nowait((job_id, req))
+        return
+    await redis_client.lpush(JOB_QUEUE_KEY, QueuedJob(job_id=job_id, params=req).model_dump_json())
+
+async def dequeue_job() -> Tuple[str, AnalysisRequest]:
+    """Wait for the next queued analysis job."""
+    if redis_client is None:
+        return await local_job_queue.get()
+    _, payload = await redis_client.brpop(JOB_QUEUE_KEY, timeout=0)
+    # Parsed and validated in one pass by pydantic-core, without building dicts first
+    job = QueuedJob.model_validate_json(payload)
+    return job.job_id, job.params
+
+async def release_interrupted_job(job_id: str, req: AnalysisRequest) -> None:
+    """Give a job cut short by shutdown back to the queue, or fail it if the queue dies with this process."""
+    try:
+        if redis_client is None:
+            await set_job(job_id, {
+                'state': 'FAILED',
+                'error': 'Interrupted by server shutdown',
+                'completed_at_ns': time.time_ns()
+            })
+            await notify_job_done(job_id)
+            return
+        await set_job(job_id, {'state': 'QUEUED'})
+        # Workers pop from the right, so this job is the next one taken
+        await redis_client.rpush(JOB_QUEUE_KEY, QueuedJob(job_id=job_id, params=req).model_dump_json())
+        logger.info("Requeued interrupted job %s", job_id)
+    except Exception as e:
+        logger.error("Failed to release interrupted job %s: %s", job_id, e, exc_info=True)
+
+async def get_queue_depth() -> int:
+    """Get the number of analysis jobs waiting for a worker."""
+    if redis_client is None:
+        return local_job_queue.qsize()
+    return await redis_client.llen(JOB_QUEUE_KEY)
+
+async def job_worker():
+    """Run queued analysis jobs one at a time until cancelled."""
+    while True:
+        try:
+            job_id, req = await dequeue_job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Error reading job queue: %s", e)
+            await asyncio.sleep(1)
+            continue
+        # A job store error while recording the outcome must not end the worker
+        try:
+            await run_analysis_job(job_id, req)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Error running job %s: %s", job_id, e, exc_info=True)
+
+async def run_job_workers() -> None:
+    """Run JOB_WORKERS job workers without the HTTP server until SIGTERM or SIGINT.
+    
+    Lets a separate deployment drain the Redis queue and scale independently
+    of the API instances, which can then run with JOB_WORKERS=0.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    # Same startup and shutdown as the API: env check, thread pools, workers
+    async with lifespan(app):
+        logger.info("Running %s job workers", JOB_WORKERS)
+        await stop.wait()
 
 # --- API Endpoints ---
 
@@ -419,7 +1457,7 @@ async def run_analysis_job(job_id: str, analysis_params: Dict):
                 "application/json": {
                     "example": {
                         "status": "healthy",
-                        "timestamp": "2025-07-30T23:46:19.318168"
+                        "timestamp": "2025-07-30T23:46:19.318168Z"
                     }
                 }
             }
@@ -437,16 +1475,57 @@ async def health_check():
     - `status`: Always "healthy" when the service is running
     - `timestamp`: ISO formatted timestamp of when the check was performed
     """
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    return {"status": "healthy", "timestamp": utc_timestamp()}
+
+@app.get(
+    "/metrics",
+    tags=["System Health"],
+    summary="Job Queue Metrics",
+    description="Report analysis job backlog so operators can see backpressure",
+    responses={
+        200: {
+            "description": "Current job queue metrics",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "queued_jobs": 3,
+                        "job_workers": 16,
+                        "timestamp": "2025-07-30T23:46:19.318168Z"
+                    }
+                }
+            }
+        }
+    }
+)
+async def metrics():
+    """
+    **Job Queue Metrics**
+    
+    Returns the number of asynchronous analysis jobs waiting for a worker.
+    With Redis this is the depth of the shared queue across all instances.
+    
+    **Returns:**
+    - `queued_jobs`: Jobs submitted via POST /api/ai that have not started yet
+    - `job_workers`: Jobs each instance runs concurrently
+    - `timestamp`: ISO formatted timestamp of when the metrics were read
+    """
+    return {
+        "queued_jobs": await get_queue_depth(),
+        "job_workers": JOB_WORKERS,
+        "timestamp": utc_timestamp()
+    }
 
 @app.post(
     "/analyze-requirement", 
-    response_model=AnalysisResult, 
     tags=["Requirements Analysis"],
     summary="Analyze Requirements (Synchronous)",
     description="Perform complete requirements analysis against INCOSE/EARS standards and regulatory compliance",
+    # Documented with AnalysisResult but not passed through it: the payload is
+    # built here from schema-constrained Gemini output, so validating it again
+    # on the way out would be pure overhead
     responses={
         200: {
+            "model": AnalysisResult,
             "description": "Analysis completed successfully",
             "content": {
                 "application/json": {
@@ -460,16 +1539,18 @@ async def health_check():
                             "ears_format": "When a user submits a request, the system shall respond within 2 seconds.",
                             "quality_rating": "8"
                         },
-                        "processed_timestamp": "2025-07-30T23:46:19.318168"
+                        "processed_timestamp": "2025-07-30T23:46:19.318168Z"
                     }
                 }
             }
         },
         422: {"description": "Validation Error"},
+        429: {"description": "Rate limit exceeded"},
         500: {"description": "Internal Server Error"}
     }
 )
-async def analyze_requirement_sync(req: AnalysisRequest):
+@limiter.limit(ANALYSIS_RATE_LIMIT)
+async def analyze_requirement_sync(request: Request, req: AnalysisRequest):
     """
     **Synchronous Requirements Analysis**
     
@@ -495,46 +1576,17 @@ async def analyze_requirement_sync(req: AnalysisRequest):
     Complete analysis results including original analysis, regulatory findings, and final enhanced requirements.
     """
     try:
-        logger.info(f"Starting analysis for requirement: {req.original_requirement[:50]}...")
-        
-        analysis_json = await analyze_requirement_step1(
-            req.original_requirement, req.system_name, req.objective, req.req_id, req.temperature
-        )
-        
-        try:
-            regulation_text = await get_regulation_document(req.regulation_document_name, req.organizationId)
-            analysis_json2 = await analyze_regulation_step2(
-                analysis_json, regulation_text, req.regulation_document_name, req.temperature
-            )
-        except FileNotFoundError:
-            analysis_json2 = {
-                "regulation_document": req.regulation_document_name,
-                "relevant_passages": [],
-                "compliance_concerns": ["No regulation document found for analysis"],
-                "regulatory_keywords": [],
-                "analysis_timestamp": datetime.now().isoformat()
-            }
+        logger.info("Starting analysis for requirement: %s...", req.original_requirement[:50])
         
-        analysis_json3 = await analyze_compliance_step3(
-            analysis_json, analysis_json2, req.temperature
-        )
-        
-        response_data = {
-            "status": "success",
-            "organizationId": req.organizationId,
-            "analysisJson": analysis_json,
-            "analysisJson2": analysis_json2, 
-            "analysisJson3": analysis_json3,
-            "processed_timestamp": datetime.now().isoformat()
-        }
+        results = await run_analysis_pipeline(req)
         
         logger.info("Analysis completed successfully")
-        return response_data
+        return Response(content=render_analysis_result(results, req.organizationId), media_type="application/json")
         
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         raise HTTPException(status_code=500, detail=f"Invalid JSON in AI response: {str(e)}")
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}\n{traceback.format_exc()}")
+        logger.error("Unexpected error: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @app.get(
@@ -641,16 +1693,26 @@ async def upload_organization_documents(organization_id: str, files: List[Upload
     - Upload confirmation message
     - Organization ID for verification
     """
-    uploaded_files = []
+    # Check every file before uploading any, so one bad file rejects the
+    # request without leaving the others behind in the bucket
     for file in files:
         if not file.filename.lower().endswith('.pdf'):
             raise HTTPException(status_code=400, detail=f"Only PDF files are allowed. Got: {file.filename}")
         
-        file_content = await file.read()
-        final_filename = await upload_file_to_organization_bucket(file_content, file.filename, organization_id)
-        uploaded_files.append(final_filename)
+        header = await file.read(len(PDF_MAGIC))
+        await file.seek(0)
+        if header != PDF_MAGIC:
+            raise HTTPException(status_code=400, detail=f"File is not a valid PDF: {file.filename}")
+    
+    upload_slots = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+    
+    async def _one(file: UploadFile) -> str:
+        async with upload_slots:
+            return await upload_file_to_organization_bucket(file.file, file.filename, organization_id, size=file.size)
     
-    logger.info(f"Successfully uploaded {len(uploaded_files)} files to organization {organization_id}")
+    uploaded_files = await asyncio.gather(*[_one(file) for file in files])
+    
+    logger.info("Successfully uploaded %s files to organization %s", len(uploaded_files), organization_id)
     return {
         "organizationId": organization_id,
         "files": uploaded_files, 
@@ -751,7 +1813,7 @@ async def upload_files_legacy(organizationId: str = Form(...), files: List[Uploa
             "content": {
                 "application/json": {
                     "example": {
-                        "runId": "550e8400-e29b-41d4-a716-446655440000",
+                        "runId": "550e8400e29b41d4a716446655440000",
                         "organizationId": "atoms-tech",
                         "state": "QUEUED",
                         "message": "Analysis pipeline started successfully"
@@ -760,10 +1822,13 @@ async def upload_files_legacy(organizationId: str = Form(...), files: List[Uploa
             }
         },
         422: {"description": "Validation Error"},
-        500: {"description": "Failed to start pipeline"}
+        429: {"description": "Rate limit exceeded"},
+        500: {"description": "Failed to start pipeline"},
+        503: {"description": "Job queue is full, retry later"}
     }
 )
-async def start_pipeline(req: PipelineRequest, background_tasks: BackgroundTasks):
+@limiter.limit(ANALYSIS_RATE_LIMIT)
+async def start_pipeline(request: Request, req: PipelineRequest):
     """
     **Start Asynchronous Analysis Pipeline**
     
@@ -791,14 +1856,21 @@ async def start_pipeline(req: PipelineRequest, background_tasks: BackgroundTasks
     **Next Steps:**
     Use the GET /api/ai endpoint with the returned `runId` to check progress and retrieve results.
     """
-    job_id = str(uuid.uuid4())
-    job_storage[job_id] = {
+    if await get_queue_depth() >= MAX_QUEUED_JOBS:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many analysis jobs are queued, retry later",
+            headers={"Retry-After": "30"}
+        )
+    
+    job_id = uuid.uuid4().hex
+    await set_job(job_id, {
         'state': 'QUEUED',
-        'started_at': datetime.now().isoformat(),
+        'started_at_ns': time.time_ns(),
         'organization_id': req.organizationId
-    }
+    })
     
-    background_tasks.add_task(run_analysis_job, job_id, req.dict())
+    await enqueue_job(job_id, req)
     
     return {
         "runId": job_id,
@@ -821,20 +1893,20 @@ async def start_pipeline(req: PipelineRequest, background_tasks: BackgroundTasks
                         "running": {
                             "summary": "Job in progress",
                             "value": {
-                                "runId": "550e8400-e29b-41d4-a716-446655440000",
+                                "runId": "550e8400e29b41d4a716446655440000",
                                 "organizationId": "atoms-tech",
                                 "state": "RUNNING",
-                                "started_at": "2025-07-30T23:46:19.318168"
+                                "started_at": "2025-07-30T23:46:19.318168Z"
                             }
                         },
                         "completed": {
                             "summary": "Job completed",
                             "value": {
-                                "runId": "550e8400-e29b-41d4-a716-446655440000",
+                                "runId": "550e8400e29b41d4a716446655440000",
                                 "organizationId": "atoms-tech",
                                 "state": "DONE",
-                                "started_at": "2025-07-30T23:46:19.318168",
-                                "completed_at": "2025-07-30T23:47:25.123456",
+                                "started_at": "2025-07-30T23:46:19.318168Z",
+                                "completed_at": "2025-07-30T23:47:25.123456Z",
                                 "result": {
                                     "status": "success",
                                     "analysisJson": "...",
@@ -851,7 +1923,12 @@ async def start_pipeline(req: PipelineRequest, background_tasks: BackgroundTasks
         500: {"description": "Internal Server Error"}
     }
 )
-async def get_pipeline_status(runId: str, organizationId: str = None):
+async def get_pipeline_status(
+    request: Request,
+    runId: str,
+    organizationId: str = None,
+    wait: float = Query(0, ge=0, le=MAX_STATUS_WAIT_SECONDS)
+):
     """
     **Get Analysis Pipeline Status**
     
@@ -860,6 +1937,7 @@ async def get_pipeline_status(runId: str, organizationId: str = None):
     **Parameters:**
     - `runId`: Unique job identifier from the POST /api/ai response
     - `organizationId`: Optional organization ID for additional verification
+    - `wait`: Optional seconds (up to 60) to hold the request open until the job is DONE or FAILED
     
     **Job States:**
     - `QUEUED`: Job is waiting to be processed
@@ -869,40 +1947,92 @@ async def get_pipeline_status(runId: str, organizationId: str = None):
     
     **Polling:**
     - Check status periodically until state is DONE or FAILED
+    - Or long-poll with `wait` to get the result as soon as the job finishes
     - Typical processing time: 30-60 seconds per requirement
-    - Results are cached for 24 hours after completion
+    - Results are cached for 24 hours after completion; expired jobs return 410
+    - DONE/FAILED responses carry an `ETag`; send it back in `If-None-Match` to get `304 Not Modified`
     
     **Returns:**
     - Current job state and timestamps
     - Complete analysis results when DONE
     - Error details when FAILED
     """
-    if runId not in job_storage:
+    job = await wait_for_job(runId, wait) if wait > 0 else await get_job(runId)
+    if job is None:
+        if job_expired(runId):
+            raise HTTPException(status_code=410, detail="Job results have expired")
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = job_storage[runId]
-    response = {
-        "runId": runId,
-        "organizationId": organizationId or job.get('organization_id', 'default'),
-        "state": job['state'],
-        "started_at": job.get('started_at'),
-        "completed_at": job.get('completed_at')
-    }
+    # Finished jobs never change, so clients and proxies may reuse them
+    if job['state'] in TERMINAL_JOB_STATES:
+        etag = f'W/"{runId}-{job["state"]}"'
+        headers = {"ETag": etag, "Cache-Control": f"private, max-age={JOB_TTL_SECONDS}, immutable"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+    else:
+        headers = {"Cache-Control": "no-store"}
     
     if job['state'] == 'DONE':
-        response['result'] = job.get('result')
+        # Spliced into the response without being parsed or re-serialized
+        outcome = b',"result":' + zstandard.decompress(job['result'])
     elif job['state'] == 'FAILED':
-        response['error'] = job.get('error')
+        outcome = b',"error":' + orjson.dumps(job.get('error'))
+    else:
+        outcome = b""
     
-    return response
+    body = JOB_STATUS_TEMPLATE % (
+        orjson.dumps(runId),
+        orjson.dumps(organizationId or job.get('organization_id', 'default')),
+        orjson.dumps(job['state']),
+        orjson.dumps(format_job_time(job, 'started_at')),
+        orjson.dumps(format_job_time(job, 'completed_at')),
+        outcome
+    )
+    return Response(content=body, headers=headers, media_type="application/json")
+
+# --- API Documentation ---
+
+# The schema and docs pages never change while the app runs, so they are
+# rendered once and served as bytes instead of being rebuilt per request
+OPENAPI_URL = "/openapi.json"
+SWAGGER_UI_HTML = get_swagger_ui_html(openapi_url=OPENAPI_URL, title=f"{app.title} - Swagger UI").body
+REDOC_HTML = get_redoc_html(openapi_url=OPENAPI_URL, title=f"{app.title} - ReDoc").body
+
+@functools.lru_cache(maxsize=None)
+def get_openapi_bytes() -> bytes:
+    """Get the serialized OpenAPI schema, built on first use once all routes exist."""
+    return orjson.dumps(app.openapi())
+
+@app.get(OPENAPI_URL, include_in_schema=False)
+async def openapi_schema():
+    return Response(content=get_openapi_bytes(), media_type="application/json")
+
+@app.get("/docs", include_in_schema=False)
+async def swagger_ui():
+    return HTMLResponse(content=SWAGGER_UI_HTML)
+
+@app.get("/redoc", include_in_schema=False)
+async def redoc():
+    return HTMLResponse(content=REDOC_HTML)
 
 if __name__ == "__main__":
-    import uvicorn
-    required_env_vars = ['GEMINI_API_KEY']
-    missing_vars = [var for var in required_env_vars if not os.getenv(var)]
-    if missing_vars:
-        logger.error(f"Missing required environment variables: {missing_vars}")
-        exit(1)
+    if sys.argv[1:] == ["worker"]:
+        # Only meaningful with a shared queue; a local one would never get jobs
+        if redis_client is None:
+            logger.error("The job worker needs REDIS_URL to read the shared job queue")
+            sys.exit(1)
+        asyncio.run(run_job_workers())
+        sys.exit(0)
     
+    # Local development; the container runs gunicorn with uvicorn workers
+    import uvicorn
     port = int(os.getenv("PORT", 8080))
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    # Import string form, which uvicorn requires to start several workers
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=port,
+        workers=WEB_CONCURRENCY,
+        loop="uvloop",
+        http="httptools"
+    )
\ No newline at end of file
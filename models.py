@@ -1,7 +1,14 @@
-from pydantic import BaseModel, Field, field_validator
-from typing import List, Optional, Union
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Optional
+from typing_extensions import TypedDict
+
+# Models are validated once from request, queue or model data and never
+# modified afterwards; frozen makes assigning to a field raise instead
+MODEL_CONFIG = ConfigDict(frozen=True, extra='ignore')
 
 class AnalysisRequest(BaseModel):
+    model_config = MODEL_CONFIG
+    
     original_requirement: str
     regulation_document_name: str
     organizationId: str
@@ -13,7 +20,16 @@ class AnalysisRequest(BaseModel):
 class PipelineRequest(AnalysisRequest):
     action: str = "startPipeline"
 
+class QueuedJob(BaseModel):
+    """Analysis job as passed through the Redis job queue."""
+    model_config = MODEL_CONFIG
+    
+    job_id: str
+    params: AnalysisRequest
+
 class Step1Analysis(BaseModel):
+    model_config = MODEL_CONFIG
+    
     req_id: str
     original_requirement: str
     incose_format: str
@@ -21,22 +37,21 @@ class Step1Analysis(BaseModel):
     incose_violations: List[str]
     ears_violations: List[str]
     requirement_pattern: str
-    quality_rating: Union[str, int]
+    quality_rating: str
     feedback: str
     analysis_timestamp: str
-    
-    @field_validator('quality_rating')
-    @classmethod
-    def convert_quality_rating(cls, v):
-        return str(v)
 
 class RelevantPassage(BaseModel):
+    model_config = MODEL_CONFIG
+    
     section: str
     text: str
     relevance_score: str
     impact: str
 
 class Step2Analysis(BaseModel):
+    model_config = MODEL_CONFIG
+    
     regulation_document: str
     relevant_passages: List[RelevantPassage]
     compliance_concerns: List[str]
@@ -44,6 +59,8 @@ class Step2Analysis(BaseModel):
     analysis_timestamp: str
 
 class Step3Analysis(BaseModel):
+    model_config = MODEL_CONFIG
+    
     final_requirement_ears: str
     final_requirement_incose: str
     compliance_status: str
@@ -51,18 +68,57 @@ class Step3Analysis(BaseModel):
     resolution_strategies: List[str]
     compliance_recommendations: List[str]
     regulatory_traceability: List[str]
-    final_quality_rating: Union[str, int]
+    final_quality_rating: str
     enhancement_summary: str
     analysis_timestamp: str
-    
-    @field_validator('final_quality_rating')
-    @classmethod
-    def convert_final_quality_rating(cls, v):
-        return str(v)
 
 class AnalysisResult(BaseModel):
+    model_config = MODEL_CONFIG
+    
     status: str
     analysisJson: Step1Analysis
     analysisJson2: Step2Analysis
     analysisJson3: Step3Analysis
     processed_timestamp: str
+
+# Response schemas passed to Gemini structured output (response_schema).
+# Ratings are requested as strings, the type the models above declare.
+# analysis_timestamp is stamped by the server, not generated by the model.
+
+class Step1Response(TypedDict):
+    req_id: str
+    original_requirement: str
+    incose_format: str
+    ears_format: str
+    incose_violations: List[str]
+    ears_violations: List[str]
+    requirement_pattern: str
+    quality_rating: str
+    feedback: str
+
+class Step1BatchResponse(Step1Response):
+    # Position of the requirement in the batch, echoed back to match results to requests
+    index: int
+
+class RelevantPassageResponse(TypedDict):
+    section: str
+    text: str
+    relevance_score: str
+    impact: str
+
+class Step2Response(TypedDict):
+    regulation_document: str
+    relevant_passages: List[RelevantPassageResponse]
+    compliance_concerns: List[str]
+    regulatory_keywords: List[str]
+
+class Step3Response(TypedDict):
+    final_requirement_ears: str
+    final_requirement_incose: str
+    compliance_status: str
+    identified_conflicts: List[str]
+    resolution_strategies: List[str]
+    compliance_recommendations: List[str]
+    regulatory_traceability: List[str]
+    final_quality_rating: str
+    enhancement_summary: str
@@ -0,0 +1,34 @@
+import threading
+from typing import List
+import pypdfium2 as pdfium
+
+# PDF text extraction shared by the API and its process pool. Kept apart from
+# app.py so that spawned pool processes import only PDFium, not the web app
+# and its Google Cloud, Redis and cache clients.
+
+# PDFium is not thread-safe, so every call into it must hold this lock
+PDFIUM_LOCK = threading.Lock()
+
+def read_pages(pdf: pdfium.PdfDocument, start: int, stop: int) -> List[str]:
+    """Read the text of pages start to stop of an open document."""
+    pages = []
+    for index in range(start, stop):
+        # Taken per page rather than per document, so threads extracting
+        # several regulations take turns instead of a long one blocking the rest
+        with PDFIUM_LOCK:
+            page = pdf[index]
+            textpage = page.get_textpage()
+            pages.append(textpage.get_text_bounded())
+            textpage.close()
+            page.close()
+    return pages
+
+def extract_page_range(pdf_path: str, start: int, stop: int) -> List[str]:
+    """Extract text from pages start to stop of a PDF file, one string per page."""
+    with PDFIUM_LOCK:
+        pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        return read_pages(pdf, start, stop)
+    finally:
+        with PDFIUM_LOCK:
+            pdf.close()
@@ -0,0 +1,11 @@
+import os
+import sys
+import google.auth
+from google.auth.credentials import AnonymousCredentials
+
+# app.py configures Gemini and Cloud Storage at import; give it a dummy key and
+# anonymous credentials so the tests run without a Google Cloud project
+os.environ.setdefault("GEMINI_API_KEY", "test")
+google.auth.default = lambda *args, **kwargs: (AnonymousCredentials(), "test-project")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,92 @@
+import asyncio
+from types import SimpleNamespace
+import orjson
+import app
+from models import AnalysisRequest
+
+def make_request(text: str, organization_id: str = "org-a", **kwargs) -> AnalysisRequest:
+    return AnalysisRequest(
+        original_requirement=text,
+        regulation_document_name="regulation.pdf",
+        organizationId=organization_id,
+        **kwargs
+    )
+
+def fake_result(req: AnalysisRequest) -> dict:
+    return {"req_id": req.req_id, "original_requirement": req.original_requirement}
+
+def run_batched(requests, max_size=8):
+    """Send requests through a fresh Step1Batcher concurrently and collect their results."""
+    async def main():
+        batcher = app.Step1Batcher(max_size=max_size, max_wait=0.01)
+        return await asyncio.gather(*(batcher.analyze(req) for req in requests))
+    return asyncio.run(main())
+
+def test_batches_are_grouped_by_organization_and_temperature(monkeypatch):
+    calls = []
+    async def fake_batch(requests, temperature):
+        calls.append(([req.original_requirement for req in requests], temperature))
+        return [fake_result(req) for req in requests]
+    monkeypatch.setattr(app, "analyze_requirements_step1_batch", fake_batch)
+
+    requests = [
+        make_request("a1"),
+        make_request("b1", organization_id="org-b"),
+        make_request("a2"),
+        make_request("b2", organization_id="org-b"),
+        make_request("a3", temperature=0.5),
+        make_request("a4", temperature=0.5)
+    ]
+    results = run_batched(requests)
+
+    assert sorted(calls) == [(["a1", "a2"], 0.1), (["a3", "a4"], 0.5), (["b1", "b2"], 0.1)]
+    assert [result["original_requirement"] for result in results] == ["a1", "b1", "a2", "b2", "a3", "a4"]
+
+def test_full_batch_is_sent_without_waiting(monkeypatch):
+    calls = []
+    async def fake_batch(requests, temperature):
+        calls.append(len(requests))
+        return [fake_result(req) for req in requests]
+    individual = []
+    async def fake_step1(original_requirement, system_name, objective, req_id, temperature):
+        individual.append(original_requirement)
+        return {"original_requirement": original_requirement}
+    monkeypatch.setattr(app, "analyze_requirements_step1_batch", fake_batch)
+    monkeypatch.setattr(app, "analyze_requirement_step1", fake_step1)
+
+    run_batched([make_request(f"r{index}") for index in range(5)], max_size=2)
+
+    # The request left over is sent on its own once the wait runs out
+    assert calls == [2, 2]
+    assert individual == ["r4"]
+
+def test_batch_results_are_matched_by_index(monkeypatch):
+    requests = [make_request("The pump shall stop.", req_id="R1"), make_request("The valve shall 'close'.")]
+    async def fake_generate(prompt, generation_config):
+        # Reversed, with the requirement text reworded the way the model often does
+        return SimpleNamespace(text=orjson.dumps([
+            {"index": 1, "req_id": "R2", "original_requirement": "The valve shall “close”."},
+            {"index": 0, "req_id": "R1", "original_requirement": "The pump shall stop"}
+        ]))
+    monkeypatch.setattr(app.GEMINI_MODEL, "generate_content_async", fake_generate)
+
+    results = asyncio.run(app.analyze_requirements_step1_batch(requests))
+
+    assert [result["req_id"] for result in results] == ["R1", "R2"]
+    assert all("index" not in result and "analysis_timestamp" in result for result in results)
+
+def test_failed_batch_falls_back_to_individual_calls(monkeypatch):
+    async def fake_generate(prompt, generation_config):
+        # One index missing and another repeated
+        return SimpleNamespace(text=orjson.dumps([{"index": 0}, {"index": 0}]))
+    individual = []
+    async def fake_step1(original_requirement, system_name, objective, req_id, temperature):
+        individual.append(original_requirement)
+        return {"original_requirement": original_requirement}
+    monkeypatch.setattr(app.GEMINI_MODEL, "generate_content_async", fake_generate)
+    monkeypatch.setattr(app, "analyze_requirement_step1", fake_step1)
+
+    results = run_batched([make_request("a1"), make_request("a2")])
+
+    assert sorted(individual) == ["a1", "a2"]
+    assert [result["original_requirement"] for result in results] == ["a1", "a2"]
@@ -0,0 +1,7 @@
+from uvicorn.workers import UvicornWorker
+
+class UvloopWorker(UvicornWorker):
+    """Gunicorn worker running uvicorn on uvloop and httptools."""
+    # UvicornWorker defaults to loop="auto" and http="auto", which would fall
+    # back to asyncio and h11 without a word if either package went missing
+    CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS, "loop": "uvloop", "http": "httptools"}